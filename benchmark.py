@@ -0,0 +1,196 @@
+'''
+hot path benchmarks, runs without hardware using an in-memory scantool
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+'''
+import argparse, gc, json, platform, sys, timeit, tracemalloc
+from pyvpw import Elm327, GmVehicle, MemoryTransport, decoders, utils
+from pyvpw.vpw import VpwMessage, Priority, PhysicalAddress, Mode, DataRate
+from pyvpw.datalog import Pid, Dpid, DpidLogger
+from pyvpw.pcm import PcmType
+from pyvpw.seedkey import seedkey
+
+OSID = 12212156 # P01
+
+def elm_responder(command: bytes) -> bytes:
+    '''minimal ELM327 + PCM emulation'''
+    command = command.decode('ASCII').strip()
+    if command.upper().startswith('AT'):
+        return b'OK\r\r>'
+
+    mode = int(command[:2], 16)
+    match mode:
+        case Mode.read_block:
+            lines = [f'6CF010{mode + 0x40:02X}{command[2:4]}{OSID:06X}FF']
+        case Mode.define_dpid:
+            lines = [f'6CF010{mode + 0x40:02X}{command[2:4]}FF']
+        case Mode.get_pid_ext:
+            lines = [f'6CF010{mode + 0x40:02X}{command[2:6]}1F40FF']
+        case Mode.get_dpid:
+            dpids = [command[i:i + 2] for i in range(4, 16, 2)]
+            lines = [f'6CF010{mode + 0x40:02X}{dpid}0102030405{i:02X}FF' for i, dpid in enumerate(dpids)]
+        case _:
+            return b'NO DATA\r\r>'
+
+    return ('\r'.join(lines) + '\r\r>').encode('ASCII')
+
+PIDS = [
+    Pid('ect', 0x0005, 1, decoders.ect_c),
+    Pid('rpm', 0x000C, 2, decoders.rpm),
+    Pid('iat', 0x000F, 1, decoders.ect_c),
+    Pid('wideband', 0x114B, 1, decoders.aem30_0300),
+    Pid('timing', 0x000E, 1, decoders.timing_deg),
+    Pid('map', 0x000B, 1, decoders.map_kpa),
+    Pid('maf', 0x1250, 2, decoders.maf_hz),
+    Pid('tps', 0x0011, 1, decoders.tps),
+    Pid('kph', 0x000D, 1, decoders.kph),
+    Pid('ltft1', 0x0007, 1, decoders.fuel_trim),
+    Pid('ltft2', 0x0009, 1, decoders.fuel_trim),
+    Pid('stft1', 0x0006, 1, decoders.fuel_trim),
+    Pid('stft2', 0x0008, 1, decoders.fuel_trim),
+]
+
+def get_benchmarks() -> dict:
+    device = Elm327(MemoryTransport(elm_responder))
+    vehicle = GmVehicle(device)
+    logger = DpidLogger(vehicle)
+    for pid in PIDS:
+        logger.add_pid(pid)
+
+    dpid_request = VpwMessage(
+        Priority.physical0,
+        PhysicalAddress.pcm,
+        PhysicalAddress.scantool,
+        Mode.get_dpid,
+        DataRate.single_response,
+        (0xFE, 0xFD, 0xFC, 0xFB, 0xFA, 0xF9)
+    )
+
+    prepared_request = device.prepare(dpid_request, 6)
+
+    dpid = Dpid(0xFE)
+    dpid.pids = PIDS[:4] + PIDS[5:6]
+    dpid_data = bytes(range(6))
+    row = dict.fromkeys(logger.pids)
+    algorithm = PcmType.p01.seedkey_algorithm
+
+    return {
+        'vpw_message_init': lambda: VpwMessage(
+            Priority.physical0,
+            PhysicalAddress.pcm,
+            PhysicalAddress.scantool,
+            Mode.get_dpid,
+            DataRate.single_response,
+            (0xFE, 0xFD, 0xFC, 0xFB, 0xFA, 0xF9)
+        ),
+        'vpw_message_repr': lambda: repr(dpid_request),
+        'send_message': lambda: device.send_message(dpid_request, 6),
+        'send_prepared': lambda: device.send_prepared(prepared_request),
+        'dpid_unpack': lambda: dpid.unpack(dpid_data),
+        'dpid_unpack_into': lambda: dpid.unpack_into(row, dpid_data),
+        'get_row': logger.get_row,
+        'get_row_reuse': lambda: logger.get_row(row),
+        'decoders': lambda: (
+            decoders.aem30_0300(b'\x80'),
+            decoders.rpm(b'\x1f\x40'),
+            decoders.ect_c(b'\x80'),
+            decoders.timing_deg(b'\x80'),
+            decoders.map_kpa(b'\x80'),
+            decoders.maf_hz(b'\x1f\x40'),
+            decoders.tps(b'\x80'),
+            decoders.kph(b'\x80'),
+            decoders.fuel_trim(b'\x80'),
+        ),
+        'seedkey': lambda: seedkey(b'\x12\x34', algorithm),
+        'get_bytes_int': lambda: utils.get_bytes(0xFEFD),
+        'get_bytes_iterable': lambda: utils.get_bytes((0xFE, 0xFD, 0xFC, 0xFB, 0xFA, 0xF9)),
+        'is_hex': lambda: utils.is_hex('2a01fefdfcfbfaf9'),
+    }
+
+def count_blocks(func, number: int = 1000) -> float:
+    '''
+    memory blocks allocated per call, averaged over number calls
+    return values are kept alive so objects a call hands back (e.g. a row dict) are counted,
+    temporaries freed before the call returns are not
+    '''
+    results = [None] * number
+    gc.collect()
+    gc.disable()
+    try:
+        start = sys.getallocatedblocks()
+        for i in range(number):
+            results[i] = func()
+        blocks = sys.getallocatedblocks() - start
+    finally:
+        gc.enable()
+
+    return blocks / number
+
+def measure(func, repeat: int) -> dict:
+    '''best of repeat timings, allocated blocks per call and peak memory of a single call'''
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    ns_per_op = min(timer.repeat(repeat, number)) / number * 1e9
+    blocks_per_op = count_blocks(func)
+
+    tracemalloc.start()
+    func() # warm up caches
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ns_per_op': ns_per_op,
+        'ops_per_sec': 1e9 / ns_per_op,
+        'blocks_per_op': blocks_per_op,
+        'peak_bytes': peak - start,
+    }
+
+def compare(results: dict, baseline: dict, file=sys.stderr):
+    print(f'{"benchmark":<20} {"baseline ns":>12} {"current ns":>12} {"change":>8} {"blocks/op":>16} {"peak bytes":>16}', file=file)
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'{name:<20} {"-":>12} {result["ns_per_op"]:>12.0f}', file=file)
+            continue
+        old = baseline[name]
+        change = (result['ns_per_op'] / old['ns_per_op'] - 1) * 100
+        blocks = f'{old.get("blocks_per_op", float("nan")):.1f} -> {result["blocks_per_op"]:.1f}' # older results have no block count
+        peak = f'{old["peak_bytes"]} -> {result["peak_bytes"]}'
+        print(f'{name:<20} {old["ns_per_op"]:>12.0f} {result["ns_per_op"]:>12.0f} {change:>+7.1f}% {blocks:>16} {peak:>16}', file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pyvpw hot paths against an in-memory scantool')
+    parser.add_argument('-o', '--output', help='write results to JSON file')
+    parser.add_argument('-c', '--compare', help='JSON results file to compare against')
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks containing this string')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='timing repeats, best is reported')
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in get_benchmarks().items():
+        if args.filter in name:
+            results[name] = measure(func, args.repeat)
+            result = results[name]
+            print(f'{name:<20} {result["ns_per_op"]:>12.0f} ns/op {result["blocks_per_op"]:>8.1f} blocks/op {result["peak_bytes"]:>8} peak bytes', file=sys.stderr)
+
+    output = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+if __name__ == '__main__':
+    main()
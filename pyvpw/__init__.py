@@ -1,2 +1,3 @@
 from .device import Elm327
-from .vehicle import GmVehicle
\ No newline at end of file
+from .vehicle import GmVehicle
+from .transport import SerialTransport, TcpTransport, MemoryTransport
\ No newline at end of file
@@ -1,12 +1,19 @@
 from typing import Any
+import time
+from .vpw import DefineBy
+from .exceptions import DeviceException
+from .decoders import raw
 
 DPID_MAX = 0xFE
 DPID_MIN = 0xF2
 DPID_MAX_BYTES = 6
 
 class Pid:
-    def __init__(self, name: str, pid: int, size: int, decoder=lambda x: x):
-        assert pid in range(0xFFFF)
+    define_by = DefineBy.pid
+    id_range = range(0xFFFF)
+
+    def __init__(self, name: str, pid: int, size: int, decoder=raw):
+        assert pid in self.id_range
         self.name = name
         self.id = pid
         self.size = size # number of data bytes returned
@@ -17,9 +24,9 @@ class Pid:
 
     def __eq__(self, other):
         if isinstance(other, Pid):
-            return self.id == other.id
-        elif isinstance(other, int):
-            return self.id == other
+            return (self.define_by, self.id) == (other.define_by, other.id)
+        elif isinstance(other, int): # ints are PID numbers, never memory addresses
+            return self.define_by == DefineBy.pid and self.id == other
         elif isinstance(other, bytes):
             return bytes(self) == other
         else:
@@ -34,6 +41,17 @@ class Pid:
     def __repr__(self):
         return self.name
 
+class MemoryPid(Pid):
+    '''value read from a PCM memory address (e.g. a RAM variable) through a DPID'''
+    define_by = DefineBy.address
+    id_range = range(0x1000000) # 3 byte address
+
+    def __init__(self, name: str, address: int, size: int, decoder=raw):
+        super().__init__(name, address, size, decoder)
+
+    def __bytes__(self):
+        return self.id.to_bytes(3)
+
 class Dpid:
     '''diagnostic data packet'''
     def __init__(self, dpid: int):
@@ -61,7 +79,7 @@ class Dpid:
         if isinstance(key, Pid):
             return key in self.pids
         elif isinstance(key, int):
-            return key in [pid.id for pid in self.pids]
+            return key in [pid.id for pid in self.pids if pid.define_by == DefineBy.pid]
         elif isinstance(key, bytes):
             return key in [bytes(pid) for pid in self.pids]
         else:
@@ -76,13 +94,75 @@ class Dpid:
         return DPID_MAX_BYTES - len(self)
 
     def unpack(self, data: bytes) -> dict[Pid, bytes]:
-        values = dict.fromkeys(self.pids)
+        '''split response data into undecoded bytes per PID'''
+        return self.unpack_into({}, data, decode=False)
+
+    def unpack_into(self, row: dict[Pid, Any], data: bytes, decode: bool = True) -> dict[Pid, Any]:
+        '''store the value of each PID from response data in row'''
         read_byte = 0
-        for pid in values:
-            values[pid] = data[read_byte: read_byte + pid.size]
+        for pid in self.pids:
+            value = data[read_byte: read_byte + pid.size]
+            row[pid] = pid.decoder(value) if decode else value
             read_byte += pid.size
 
-        return values
+        return row
+
+class Sample:
+    '''row of decoded values with monotonic acquisition time and latency in seconds'''
+    __slots__ = ('time', 'latency', 'values')
+
+    def __init__(self, values: dict[Pid, Any] | None, t: float = 0.0, latency: float = 0.0):
+        self.values = values
+        self.time = t
+        self.latency = latency
+
+class StreamStats:
+    '''per sample latency and jitter statistics for DpidLogger.stream()'''
+    def __init__(self, period: float | None = None):
+        self.period = period
+        self.samples = 0
+        self.overruns = 0 # scheduled samples skipped because acquisition fell behind
+        self.dropped = 0 # samples lost to device errors
+        self.latency_min = float('inf')
+        self.latency_max = 0.0
+        self._latency_total = 0.0
+        self._last_time = None
+        self._intervals = 0
+        self._interval_mean = 0.0
+        self._interval_m2 = 0.0 # sum of squared deviations (Welford)
+
+    def update(self, sample: Sample):
+        self.samples += 1
+        self._latency_total += sample.latency
+        self.latency_min = min(self.latency_min, sample.latency)
+        self.latency_max = max(self.latency_max, sample.latency)
+
+        if self._last_time is not None:
+            interval = sample.time - self._last_time
+            self._intervals += 1
+            delta = interval - self._interval_mean
+            self._interval_mean += delta / self._intervals
+            self._interval_m2 += delta * (interval - self._interval_mean)
+        self._last_time = sample.time
+
+    @property
+    def latency_mean(self) -> float:
+        return self._latency_total / self.samples if self.samples else 0.0
+
+    @property
+    def interval_mean(self) -> float:
+        '''mean time between samples'''
+        return self._interval_mean
+
+    @property
+    def jitter(self) -> float:
+        '''standard deviation of time between samples'''
+        return (self._interval_m2 / self._intervals) ** 0.5 if self._intervals else 0.0
+
+    @property
+    def rate(self) -> float:
+        '''mean samples per second'''
+        return 1 / self._interval_mean if self._interval_mean else 0.0
 
 class DpidLogger:
     def __init__(self, vehicle):
@@ -90,6 +170,8 @@ class DpidLogger:
         self.pids = {}
         self._dpids = []
         self._avaliable_dpids = [Dpid(i) for i in range(DPID_MIN, DPID_MAX+1)]
+        self.stats = None # StreamStats of the last stream()
+        self._requests = None # (dpids, PreparedRequest) per get_dpids request, rebuilt when PIDs change
 
     def add_pid(self, pid: Pid):
         '''add PID to data logger'''
@@ -97,33 +179,247 @@ class DpidLogger:
         
         for dpid in self._dpids:
             if dpid.bytes_free >= pid.size:
-                self._vehicle.define_dpid(dpid.id, pid.id, pid.size, len(dpid)+1)
+                self._vehicle.define_dpid(dpid.id, pid.id, pid.size, len(dpid)+1, pid.define_by)
                 dpid.pids.append(pid)
                 self.pids.update({pid: dpid})
+                self._requests = None
                 return
         
         dpid = self._avaliable_dpids.pop()
-        self._vehicle.define_dpid(dpid.id, pid.id, pid.size, 1) # offset 1 is the first data byte
+        self._vehicle.define_dpid(dpid.id, pid.id, pid.size, 1, pid.define_by) # offset 1 is the first data byte
         dpid.pids.append(pid)
         self.pids.update({pid: dpid})
         self._dpids.append(dpid)
+        self._requests = None
 
     def remove_pid(self, pid: Pid):
         '''remove PID from data logger'''
         dpid = self.pids[pid]
-        self._vehicle.define_dpid(dpid.id, pid.id, 0, 0) # size=0 offset=0 removes pid
+        self._vehicle.define_dpid(dpid.id, pid.id, 0, 0, pid.define_by) # size=0 offset=0 removes pid
         dpid.pids.remove(pid)
         self.pids.pop(pid)
+        self._requests = None
 
-    def get_row(self) -> dict[Pid, Any]:
+    def get_row(self, row: dict[Pid, Any] | None = None) -> dict[Pid, Any]:
         '''
         query vehicle for all PIDs being logged
         returns dict of PIDs and their corresponding decoded value
+        if row is given it is updated in place and returned
         '''
-        values = dict.fromkeys(self.pids)
-        for request_dpids in [self._dpids[i:i + 6] for i in range(0, len(self._dpids), 6)]: # request groups of <= 6 dpids
-            response = self._vehicle.get_dpids([dpid.id for dpid in request_dpids])
-            for i, data in enumerate(response): # one respose line per dpid
-                values.update(request_dpids[i].unpack(data))
+        if row is None:
+            row = dict.fromkeys(self.pids)
+
+        if self._requests is None:
+            self._requests = [
+                (request_dpids, self._vehicle.prepare_get_dpids([dpid.id for dpid in request_dpids]))
+                for request_dpids in [self._dpids[i:i + 6] for i in range(0, len(self._dpids), 6)] # request groups of <= 6 dpids
+            ]
+
+        for request_dpids, request in self._requests:
+            response = self._vehicle.get_dpids(request)
+            if len(response) != len(request_dpids): # invalid frames are skipped by the device
+                raise DeviceException(f'expected {len(request_dpids)} DPIDs but received {len(response)}')
+
+            for dpid, data in zip(request_dpids, response): # one respose line per dpid
+                dpid.unpack_into(row, data)
+
+        return row
+
+    def stream(self, rate: float | None = None, reuse_row: bool = False, max_errors: int = 10):
+        '''
+        generator yielding a Sample per row
+        rate = None -> as fast as the bus allows
+        rate = n -> one sample every 1/n seconds, missed slots are skipped and counted as overruns
+        reuse_row = True -> the same Sample and values dict are updated and yielded every time
+        a row that fails with DeviceException is dropped and the device is resynchronized,
+        the exception is raised after max_errors consecutive failures
+        timing statistics are kept in self.stats
+        '''
+        period = 1 / rate if rate else None
+        self.stats = StreamStats(period)
+        sample = Sample(dict.fromkeys(self.pids))
+        t_next = time.monotonic()
+        errors = 0
+
+        while True:
+            if period is not None:
+                delay = t_next - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
 
-        return {pid: pid.decoder(value) for pid, value in values.items()}
\ No newline at end of file
+            t = time.monotonic()
+            if not reuse_row:
+                sample = Sample(None)
+
+            try:
+                sample.values = self.get_row(sample.values)
+                errors = 0
+            except DeviceException as e:
+                errors += 1
+                if errors > max_errors:
+                    raise
+                self.stats.dropped += 1
+                while True: # a failed recovery counts as another error and is retried
+                    try:
+                        self._vehicle.recover(e)
+                        break
+                    except DeviceException as recover_error:
+                        errors += 1
+                        if errors > max_errors:
+                            raise
+                        e = recover_error
+
+            t_end = time.monotonic()
+            if period is not None:
+                t_next += period
+                if t_next < t_end: # acquisition fell behind schedule
+                    missed = int((t_end - t_next) / period) + 1
+                    self.stats.overruns += missed
+                    t_next += missed * period
+
+            if errors:
+                continue
+
+            sample.time = t
+            sample.latency = t_end - t
+            self.stats.update(sample)
+            yield sample
+
+class Trigger:
+    '''
+    fires when the decoded value of a PID is above or below a threshold
+    setting both limits fires when the value is out of range
+    pid needs a numeric decoder, rows where its value is None don't change the trigger state
+    once fired the value must come back inside the limits by hysteresis before the trigger releases
+    '''
+    def __init__(self, pid: Pid, above=None, below=None, hysteresis: float = 0):
+        assert above is not None or below is not None
+        assert hysteresis >= 0
+        if pid.decoder is raw:
+            raise ValueError(f'{pid} has no decoder, triggers need numeric values')
+
+        self.pid = pid
+        self.above = above
+        self.below = below
+        self.hysteresis = hysteresis
+        self.active = False
+
+    def __call__(self, row: dict[Pid, Any]) -> bool:
+        value = row[self.pid]
+        if value is None:
+            return self.active
+
+        if self.active:
+            # release only once the value is back inside the limits by hysteresis
+            high = self.above is not None and value > self.above - self.hysteresis
+            low = self.below is not None and value < self.below + self.hysteresis
+        else:
+            high = self.above is not None and value > self.above
+            low = self.below is not None and value < self.below
+
+        self.active = high or low
+        return self.active
+
+class TriggeredCapture:
+    '''
+    keeps the most recent rows in a preallocated ring buffer and writes
+    pre_rows before and post_rows after each trigger event
+    triggers are called with the decoded row and return True to fire
+    writer is any object with a writerow() method (e.g. csv.writer), rows are [event, time, values...]
+
+    disk writes are bounded: each event writes at most pre_rows + 1 + post_rows rows,
+    triggers firing during the post trigger window don't extend it,
+    no new event starts until holdoff_rows rows after the window and
+    capture stops after max_events (None -> no limit)
+
+    outside a window triggers fire on the rising edge, rising edges during the post trigger
+    window or holdoff are dropped but a trigger that is still active on the first row after
+    them starts a new event
+    '''
+    def __init__(self, logger: DpidLogger, triggers, writer, pre_rows: int = 100, post_rows: int = 100,
+                 holdoff_rows: int = 0, max_events: int | None = None):
+        assert pre_rows >= 0 and post_rows >= 0 and holdoff_rows >= 0
+        self._logger = logger
+        self._triggers = list(triggers)
+        self._writer = writer
+        self.pids = list(logger.pids)
+
+        # one slot per row: [event, time, value0, value1, ...]
+        self._ring = [[None] * (len(self.pids) + 2) for _ in range(pre_rows + 1)]
+        self._head = 0 # next slot to fill
+        self._count = 0 # rows waiting in ring
+        self._post_rows = post_rows
+        self._remaining = 0 # post trigger rows left to write
+        self._holdoff_rows = holdoff_rows
+        self._holdoff = 0 # rows left before a new event can start
+        self._max_events = max_events
+        self._armed = True # False while triggers stay active after a rising edge was handled
+        self.events = 0
+
+    @property
+    def fieldnames(self) -> list[str]:
+        return ['event', 'time'] + [pid.name for pid in self.pids]
+
+    @property
+    def done(self) -> bool:
+        '''True once max_events have been captured and written'''
+        return self._max_events is not None and self.events >= self._max_events and not self._remaining
+
+    def add_row(self, t: float, row: dict[Pid, Any]) -> bool:
+        '''store row, returns True if a trigger fired a new event'''
+        if self.done:
+            return False
+
+        slot = self._ring[self._head]
+        slot[0] = self.events
+        slot[1] = t
+        for i, pid in enumerate(self.pids, 2):
+            slot[i] = row[pid]
+
+        fired = any([trigger(row) for trigger in self._triggers]) # call every trigger to keep its state current
+
+        if self._remaining:
+            self._writer.writerow(slot)
+            self._remaining -= 1
+            if not self._remaining:
+                self._holdoff = self._holdoff_rows
+            return False
+
+        self._head = (self._head + 1) % len(self._ring)
+        self._count = min(self._count + 1, len(self._ring))
+
+        if self._holdoff:
+            self._holdoff -= 1
+            return False
+
+        triggered = fired and self._armed
+        if triggered:
+            self.events += 1
+            self._flush()
+            self._remaining = self._post_rows
+            if not self._remaining:
+                self._holdoff = self._holdoff_rows
+            self._armed = True # checked again on the first row after the window and holdoff
+        else:
+            self._armed = not fired
+
+        return triggered
+
+    def _flush(self):
+        '''write buffered rows oldest first'''
+        size = len(self._ring)
+        start = (self._head - self._count) % size
+        for i in range(self._count):
+            slot = self._ring[(start + i) % size]
+            slot[0] = self.events
+            self._writer.writerow(slot)
+        self._count = 0
+
+    def run(self, duration: float | None = None, rate: float | None = None):
+        '''log until duration (seconds) has elapsed, max_events are captured or forever'''
+        t_start = time.monotonic()
+        for sample in self._logger.stream(rate, reuse_row=True): # values are copied into the ring
+            t = sample.time - t_start
+            if self.done or (duration is not None and t >= duration):
+                return
+            self.add_row(t, sample.values)
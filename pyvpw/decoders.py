@@ -1,3 +1,7 @@
+def raw(data: bytes):
+    '''undecoded response bytes, default for Pid'''
+    return data
+
 def aem30_0300(data: bytes):
     '''PID $114B (EGR sensor)'''
     n = int.from_bytes(data)
@@ -1,13 +1,44 @@
-import serial
 from enum import IntEnum
 from .vpw import VpwMessage
-from .exceptions import DeviceException
+from .exceptions import (
+    DeviceException,
+    NoResponseException,
+    NoDataException,
+    BusException,
+    ResponseCountException
+)
 from .utils import is_hex
+from .transport import Transport, SerialTransport, TcpTransport, TCP_DEFAULT_PORT
 
 import logging
 logger = logging.getLogger(__name__)
 
 ELM_PROMPT = b'>'
+ELM_NO_DATA = 'NO DATA'
+ELM_BUS_ERRORS = ( # See ELM327 datasheet - Messages and Meanings
+    'BUFFER FULL',
+    'BUS BUSY',
+    'BUS ERROR',
+    'DATA ERROR',
+    'FB ERROR',
+    'RX ERROR',
+    'STOPPED',
+    'UNABLE TO CONNECT',
+)
+
+class PreparedRequest:
+    '''
+    request encoded once by Device.prepare() for repeated sending with Device.send_prepared()
+    responses = number of response frames returned, None -> all
+    '''
+
+    def __init__(self, message: VpwMessage, command: str | bytes, num_lines: int | None = None, responses: int | None = None):
+        self.header = message.get_header()
+        self.command = command # command in the form the device sends it
+        self.num_lines = num_lines
+        self.responses = responses
+        self.response_mode = message.mode + 0x40
+        self.data_start = 4 + len(message.submode) # index of first data byte in response frames
 
 class Device:
     '''scantool base class'''
@@ -22,6 +53,45 @@ class Device:
     def send_command(self, command: str, num_lines: int | None = None) -> list[str]:
         raise NotImplementedError('this is only implemented in derived classes')
 
+    def recover(self, exception: DeviceException):
+        '''resynchronize after a failed command, raises if the device can't recover'''
+        raise exception
+
+    def prepare(self, message: VpwMessage, num_lines: int | None = None, responses: int | None = None) -> PreparedRequest:
+        '''encode message for send_prepared()'''
+        return PreparedRequest(message, repr(message), num_lines, responses)
+
+    def send_prepared(self, request: PreparedRequest) -> list[bytes]:
+        '''send PreparedRequest and return response frames'''
+        if self._header != request.header:
+            self.set_header(request.header)
+
+        return self._parse_frames(request, self.send_command(request.command, request.num_lines))
+
+    def _parse_frames(self, request: PreparedRequest, lines: list[str]) -> list[bytes]:
+        '''convert response lines to frames, skipping invalid lines'''
+        frames = []
+        for line in lines:
+            try:
+                frame = bytes.fromhex(line)
+            except ValueError:
+                logger.warning(f'non-hex data: {line}')
+                continue
+
+            if len(frame) <= request.data_start:
+                logger.warning(f'invalid frame: {line}')
+                continue
+
+            if frame[3] != request.response_mode:
+                logger.warning('unexpected response mode')
+
+            frames.append(frame)
+
+        if len(frames) == 0:
+            raise DeviceException('no valid data received')
+
+        return frames[:request.responses] # drop invalid lines first so they don't push out valid frames
+
     def send_message(self, message: VpwMessage, num_lines: int | None = None) -> list[VpwMessage]:
         '''send VpwMessage and return responses'''
 
@@ -54,6 +124,7 @@ class Device:
 
             except IndexError:
                 logger.warning(f'invalid frame: {frame.hex()}')
+                continue
 
             # TODO validate checksum here, maybe check mode/submode too?
             
@@ -67,37 +138,52 @@ class Device:
 
         return messages
 
+def parse_tcp_address(url: str) -> tuple[str, int]:
+    '''split 'tcp://host[:port]' or 'tcp://[ipv6][:port]' into host and port'''
+    address = url.removeprefix('tcp://')
+    if address.startswith('['):
+        host, _, port = address[1:].partition(']')
+        port = port.removeprefix(':')
+    else:
+        host, _, port = address.partition(':')
+
+    return host, int(port) if port else TCP_DEFAULT_PORT
+
 class ElmProtocol(IntEnum):
     '''ELM327 protocols'''
     auto = 0
     j1850vpw = 2
 
 class Elm327(Device):
-    '''handles serial communication with ELM327 scantools'''
+    '''
+    handles communication with ELM327 scantools
+    portname is a serial port (e.g. COM10), 'tcp://host:port' or a Transport
+    '''
 
-    def __init__(self, portname: str, **kwargs):
+    def __init__(self, portname: str | Transport, **kwargs):
         self._baudrate = kwargs.pop('baudrate', 115200)
         self._timeout = kwargs.pop('timeout', 1)
 
-        self._port = serial.Serial(
-            port=portname,
-            baudrate=self._baudrate,
-            parity=serial.PARITY_NONE,
-            stopbits=1,
-            bytesize=8,
-            timeout=self._timeout
-        )
+        if isinstance(portname, Transport):
+            self._port = portname
+        elif portname.startswith('tcp://'):
+            self._port = TcpTransport(*parse_tcp_address(portname), self._timeout)
+        else:
+            self._port = SerialTransport(portname, self._baudrate, self._timeout)
+
+        self._protocol = kwargs.pop('protocol', ElmProtocol.j1850vpw)
 
         # initalize device
         self.send_command('AT Z') # reset
+        self._configure()
+
+    def _configure(self):
+        '''apply settings after reset'''
         self.send_command('AT E0') # disable echo
         self.send_command('AT S0') # disable spaces
         self.send_command('AT H1') # display headers
         self.send_command('AT AL') # allow long (>7 byte) messages
-
-        self.set_protocol(
-            kwargs.pop('protocol', ElmProtocol.j1850vpw))
-        
+        self.set_protocol(self._protocol)
         self._header = None # current message header
 
     def send_command(self, command: str, num_lines: int | None = None) -> list[str]:
@@ -107,39 +193,96 @@ class Elm327(Device):
         ignored messages remain in buffer and may be treated as responses to subsequent commands
         num_lines = None -> read until elm timeout
         '''
-        logger.debug(f'TX: {command}')
-
         if num_lines:
             assert is_hex(command)
             command = command + str(num_lines) + '\r'
         else:
             command = command + '\r'
 
-        self._port.write(command.encode('ASCII'))
+        return self._transact(command.encode('ASCII'), num_lines)
+
+    def _transact(self, command: bytes, num_lines: int | None = None) -> list[str]:
+        '''write encoded command and return response lines'''
+        logger.debug('TX: %r', command) # lazy formatting, this runs for every datalog row
+        self._port.write(command)
 
         # read from serial port until ELM_PROMPT or timeout
         buffer = self._port.read_until(ELM_PROMPT)
 
         if len(buffer) == 0:
-            raise DeviceException('no data')
+            raise NoResponseException('no data')
+
+        if not buffer.endswith(ELM_PROMPT):
+            raise NoResponseException(f'incomplete response: {buffer}')
 
-        assert buffer.endswith(ELM_PROMPT)
         buffer = buffer[:-1]
 
         # decode buffer, split lines, remove empty lines, remove whitespace 
         string = buffer.decode('ASCII')
         lines = [line.strip() for line in string.split('\r') if line]
 
-        logger.debug(f'RX: {lines}')
+        logger.debug('RX: %s', lines)
 
         if '?' in lines:
             raise DeviceException('invalid message')
 
+        for line in lines:
+            if is_hex(line): # data, skip error checks
+                continue
+            if line == ELM_NO_DATA:
+                raise NoDataException('no data')
+            for error in ELM_BUS_ERRORS:
+                if error in line:
+                    raise BusException(line)
+
         if num_lines and (len(lines) != num_lines):
-            raise DeviceException(f'expected {num_lines} responses but received {len(lines)}')
+            raise ResponseCountException(f'expected {num_lines} responses but received {len(lines)}')
 
         return lines
 
+    def prepare(self, message: VpwMessage, num_lines: int | None = None, responses: int | None = None) -> PreparedRequest:
+        '''encode message to the exact bytes written to the device'''
+        command = repr(message)
+        if num_lines:
+            command += str(num_lines)
+
+        return PreparedRequest(message, (command + '\r').encode('ASCII'), num_lines, responses)
+
+    def send_prepared(self, request: PreparedRequest) -> list[bytes]:
+        '''send PreparedRequest without re-encoding or validating the command'''
+        if self._header != request.header:
+            self.set_header(request.header)
+
+        return self._parse_frames(request, self._transact(request.command, request.num_lines))
+
+    def recover(self, exception: DeviceException):
+        '''
+        resynchronize after a failed command using as few commands as possible
+        stale responses are discarded so they aren't read as responses to the next command
+        warm starts the device if it doesn't return to the prompt
+        '''
+        logger.warning(f'recovering from: {exception!r}')
+
+        if not isinstance(exception, NoResponseException):
+            # device returned to the prompt, discard anything received since
+            self._port.reset_input_buffer()
+            return
+
+        # device is still busy, wait for the prompt
+        buffer = self._port.read_until(ELM_PROMPT)
+        if buffer.endswith(ELM_PROMPT):
+            logger.debug(f'discarded: {buffer}')
+            return
+
+        logger.warning('device not responding, warm start')
+        try:
+            self.send_command('AT WS') # first character interrupts the device if busy
+        except DeviceException:
+            self._port.reset_input_buffer()
+            self.send_command('AT WS')
+
+        self._configure()
+
     def set_header(self, header: bytes):
         '''set message header'''
 
@@ -148,6 +291,9 @@ class Elm327(Device):
 
         self._header = header
 
+    def close(self):
+        self._port.close()
+
     def set_protocol(self, protocol: int):
         '''set protocol'''
 
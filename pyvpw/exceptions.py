@@ -5,4 +5,16 @@ class UnlockException(VehicleException):
     '''raised when PCM unlock fails'''
 
 class DeviceException(Exception):
-    '''raised for scantool errors'''
\ No newline at end of file
+    '''raised for scantool errors'''
+
+class NoResponseException(DeviceException):
+    '''raised when the scantool does not return to the prompt before timeout'''
+
+class NoDataException(DeviceException):
+    '''raised when the scantool reports no response from the vehicle'''
+
+class BusException(DeviceException):
+    '''raised when the scantool reports a bus or buffer error'''
+
+class ResponseCountException(DeviceException):
+    '''raised when the number of responses does not match the number expected'''
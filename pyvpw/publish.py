@@ -0,0 +1,182 @@
+import socket
+import struct
+import time
+from typing import Any
+from .datalog import Pid
+from .decoders import raw
+
+import logging
+logger = logging.getLogger(__name__)
+
+PUBLISHER_DEFAULT_PORT = 50327 # not TCP_DEFAULT_PORT, which ELM327 adapters and emulators use
+
+# datagram types (first byte)
+SUBSCRIBE = b'S'
+UNSUBSCRIBE = b'U'
+SCHEMA = b'N'
+ROW = b'R'
+
+ROW_HEADER = struct.Struct('<cId') # type, sequence number, timestamp
+NAN = float('nan')
+
+def mask_size(n: int) -> int:
+    '''bytes in the validity bitmask of a row with n values'''
+    return (n + 7) // 8
+
+class RowPublisher:
+    '''
+    serves rows from DpidLogger to any number of local subscribers over UDP
+    sends never block, a subscriber that can't keep up loses rows instead of stalling acquisition
+    subscribers must resubscribe within timeout seconds or they are dropped
+
+    schema datagram: 'N', struct format of PID values, ';', comma separated PID names
+    row datagram: 'R', uint32 sequence, float64 timestamp, validity bitmask, one value per PID
+    PIDs without a decoder are sent as their raw bytes, all others as float64
+    bit i of the bitmask (little endian, one bit per PID) is clear when value i is missing or invalid
+    '''
+    def __init__(self, pids, port: int = PUBLISHER_DEFAULT_PORT, host: str = '127.0.0.1', timeout: float = 5):
+        self.pids = list(pids)
+        self._raw = [pid.decoder is raw for pid in self.pids]
+        values_format = ''.join(f'{pid.size}s' if is_raw else 'd' for pid, is_raw in zip(self.pids, self._raw))
+        self._mask_size = mask_size(len(self.pids))
+        self._row = struct.Struct(ROW_HEADER.format + f'{self._mask_size}s' + values_format)
+        self._warned = set() # PIDs already logged with invalid raw values
+        self._schema = SCHEMA + f'{values_format};{",".join(pid.name for pid in self.pids)}'.encode('ASCII')
+        self._timeout = timeout
+        self._subscribers = {} # address: time of last subscribe
+        self._sequence = 0
+        self.dropped = 0 # sends refused by the socket, see RowSubscriber.missed for rows lost in transit
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self._socket.setblocking(False)
+
+    def _poll(self):
+        '''handle pending subscribe/unsubscribe requests'''
+        now = time.monotonic()
+        while True:
+            try:
+                request, address = self._socket.recvfrom(16)
+            except OSError: # nothing pending (BlockingIOError) or ICMP error from a closed subscriber
+                break
+
+            if request == SUBSCRIBE:
+                # schema is resent on every subscribe so a lost schema datagram is recovered
+                if not self._send(self._schema, address):
+                    continue
+                if address not in self._subscribers:
+                    logger.info(f'subscribed: {address}')
+                self._subscribers[address] = now
+            elif request == UNSUBSCRIBE:
+                logger.info(f'unsubscribed: {address}')
+                self._subscribers.pop(address, None)
+
+        for address, t in list(self._subscribers.items()):
+            if now - t > self._timeout:
+                logger.info(f'subscriber timed out: {address}')
+                self._subscribers.pop(address)
+
+    def _send(self, datagram: bytes, address) -> bool:
+        try:
+            self._socket.sendto(datagram, address)
+        except OSError: # socket buffer full or subscriber unreachable
+            return False
+        return True
+
+    def publish(self, t: float, row: dict[Pid, Any]):
+        '''send row to all subscribers'''
+        self._poll()
+        self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+        if not self._subscribers:
+            return
+
+        values = []
+        mask = 0
+        for i, (pid, is_raw) in enumerate(zip(self.pids, self._raw)):
+            value = row.get(pid)
+            if is_raw:
+                if isinstance(value, bytes) and len(value) == pid.size:
+                    values.append(value)
+                    mask |= 1 << i
+                    continue
+                if value is not None and pid not in self._warned:
+                    logger.warning(f'{pid}: expected {pid.size} bytes, got {value!r}')
+                    self._warned.add(pid)
+                values.append(b'')
+                continue
+            try:
+                values.append(float(value))
+                mask |= 1 << i
+            except (TypeError, ValueError):
+                values.append(NAN)
+
+        try:
+            datagram = self._row.pack(ROW, self._sequence, t, mask.to_bytes(self._mask_size, 'little'), *values)
+        except struct.error as e:
+            logger.warning(f'row not published: {e}')
+            self.dropped += len(self._subscribers)
+            return
+
+        for address in self._subscribers:
+            if not self._send(datagram, address):
+                self.dropped += 1
+
+    def close(self):
+        self._socket.close()
+
+class RowSubscriber:
+    '''receives rows from a RowPublisher'''
+    def __init__(self, port: int = PUBLISHER_DEFAULT_PORT, host: str = '127.0.0.1', timeout: float = 5):
+        self._address = (host, port)
+        self._interval = timeout / 2 # resubscribe interval
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, 0))
+        self._socket.settimeout(self._interval)
+        self._subscribed = 0
+        self._row = None
+        self.names = None
+        self.sequence = None
+        self.missed = 0 # rows lost between publisher and subscriber
+
+    def _subscribe(self):
+        self._socket.sendto(SUBSCRIBE, self._address)
+        self._subscribed = time.monotonic()
+
+    def recv(self) -> tuple[float, dict[str, float | bytes | None]]:
+        '''
+        block until a row is received, returns timestamp and dict of PID names and values
+        missing or invalid values are None
+        '''
+        while True:
+            if time.monotonic() - self._subscribed >= self._interval:
+                self._subscribe()
+
+            try:
+                datagram = self._socket.recv(65535)
+            except (TimeoutError, ConnectionError):
+                continue
+
+            if datagram[:1] == SCHEMA:
+                values_format, _, names = datagram[1:].decode('ASCII').partition(';')
+                self.names = names.split(',') if names else []
+                self._row = struct.Struct(ROW_HEADER.format + f'{mask_size(len(self.names))}s' + values_format)
+                continue
+
+            if datagram[:1] != ROW or self._row is None or len(datagram) != self._row.size:
+                continue
+
+            _, sequence, t, mask, *values = self._row.unpack(datagram)
+            mask = int.from_bytes(mask, 'little')
+            if self.sequence is not None:
+                self.missed += (sequence - self.sequence - 1) & 0xFFFFFFFF
+            self.sequence = sequence
+
+            return t, {name: value if mask >> i & 1 else None for i, (name, value) in enumerate(zip(self.names, values))}
+
+    def __iter__(self):
+        while True:
+            yield self.recv()
+
+    def close(self):
+        self._socket.sendto(UNSUBSCRIBE, self._address)
+        self._socket.close()
@@ -0,0 +1,131 @@
+import socket
+import time
+from collections.abc import Callable
+from .exceptions import DeviceException
+
+TCP_DEFAULT_PORT = 35000 # common default for WiFi ELM327 adapters
+
+class Transport:
+    '''byte stream between the host and a scantool'''
+
+    def write(self, data: bytes):
+        raise NotImplementedError('this is only implemented in derived classes')
+
+    def read_until(self, terminator: bytes) -> bytes:
+        '''
+        read until terminator or timeout
+        returns data received so far on timeout
+        '''
+        raise NotImplementedError('this is only implemented in derived classes')
+
+    def reset_input_buffer(self):
+        '''discard received data that hasn't been read'''
+        raise NotImplementedError('this is only implemented in derived classes')
+
+    def close(self):
+        pass
+
+class SerialTransport(Transport):
+    '''serial port (USB/Bluetooth ELM327), requires pyserial'''
+
+    def __init__(self, portname: str, baudrate: int = 115200, timeout: float = 1):
+        import serial # only needed for serial ports
+
+        self._port = serial.Serial(
+            port=portname,
+            baudrate=baudrate,
+            parity=serial.PARITY_NONE,
+            stopbits=1,
+            bytesize=8,
+            timeout=timeout
+        )
+
+    def write(self, data: bytes):
+        self._port.write(data)
+
+    def read_until(self, terminator: bytes) -> bytes:
+        return self._port.read_until(terminator)
+
+    def reset_input_buffer(self):
+        self._port.reset_input_buffer()
+
+    def close(self):
+        self._port.close()
+
+class TcpTransport(Transport):
+    '''TCP socket (WiFi/Ethernet ELM327)'''
+
+    def __init__(self, host: str, port: int = TCP_DEFAULT_PORT, timeout: float = 1):
+        self._timeout = timeout
+        self._buffer = bytearray()
+        self._socket = socket.create_connection((host, port), timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # commands are small, send immediately
+
+    def write(self, data: bytes):
+        self._socket.sendall(data)
+
+    def read_until(self, terminator: bytes) -> bytes:
+        deadline = time.monotonic() + self._timeout
+        while True:
+            i = self._buffer.find(terminator)
+            if i >= 0:
+                i += len(terminator)
+                data = bytes(self._buffer[:i])
+                del self._buffer[:i]
+                return data
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self._socket.settimeout(remaining)
+            try:
+                chunk = self._socket.recv(4096)
+            except TimeoutError:
+                break
+
+            if not chunk:
+                raise DeviceException('connection closed')
+
+            self._buffer += chunk
+
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def reset_input_buffer(self):
+        self._buffer.clear()
+        self._socket.setblocking(False)
+        try:
+            while self._socket.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        finally:
+            self._socket.settimeout(self._timeout)
+
+    def close(self):
+        self._socket.close()
+
+class MemoryTransport(Transport):
+    '''
+    in-memory transport for testing without hardware
+    responder is called with each write and returns the bytes the scantool would send back
+    '''
+
+    def __init__(self, responder: Callable[[bytes], bytes]):
+        self._responder = responder
+        self._buffer = bytearray()
+
+    def write(self, data: bytes):
+        self._buffer += self._responder(data)
+
+    def read_until(self, terminator: bytes) -> bytes:
+        i = self._buffer.find(terminator)
+        i = len(self._buffer) if i < 0 else i + len(terminator) # no terminator -> timeout
+        data = bytes(self._buffer[:i])
+        del self._buffer[:i]
+        return data
+
+    def reset_input_buffer(self):
+        self._buffer.clear()
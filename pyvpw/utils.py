@@ -8,5 +8,7 @@ def get_bytes(n: int | Iterable) -> bytes:
 
     return bytes(n)
 
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
 def is_hex(string: str) -> bool:
-    return all(i in set('0123456789abcdefABCDEF') for i in string)
\ No newline at end of file
+    return HEX_DIGITS.issuperset(string)
\ No newline at end of file
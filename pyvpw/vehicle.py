@@ -4,6 +4,7 @@ from .vpw import (
     VpwMessage,
     Priority,
     DataRate,
+    DefineBy,
     PhysicalAddress,
     FunctionalAddress,
     Mode
@@ -11,6 +12,7 @@ from .vpw import (
 from .seedkey import seedkey
 from .exceptions import VehicleException, UnlockException
 from .pcm import PcmType, BlockId
+from .device import PreparedRequest
 
 import logging
 logger = logging.getLogger(__name__)
@@ -21,8 +23,12 @@ class Vehicle:
     def __init__(self, device):
         self._device = device
 
-    def get_pid(self, pid: int) -> bytes:
-        '''mode $01 - request PID'''
+    def recover(self, exception):
+        '''resynchronize device after a DeviceException'''
+        self._device.recover(exception)
+
+    def prepare_get_pid(self, pid: int) -> PreparedRequest:
+        '''prepare mode $01 request for repeated get_pid() calls'''
         assert pid in range(0xFF)
 
         request = VpwMessage(
@@ -33,8 +39,15 @@ class Vehicle:
             pid
         )
 
-        response = self._device.send_message(request)[0]
-        return response.data
+        return self._device.prepare(request, responses=1)
+
+    def get_pid(self, pid: int | PreparedRequest) -> bytes:
+        '''mode $01 - request PID'''
+        if not isinstance(pid, PreparedRequest):
+            pid = self.prepare_get_pid(pid)
+
+        response = self._device.send_prepared(pid)[0]
+        return response[pid.data_start:-1]
 
     def get_supported_pids(self) -> list[int]:
         supported = []
@@ -87,8 +100,8 @@ class GmVehicle(Vehicle):
             except KeyError:
                 logger.warning(f'unknown OSID: {self.osid}')
   
-    def get_pid(self, pid: int) -> bytes:
-        '''mode $22 - request PID'''
+    def prepare_get_pid(self, pid: int) -> PreparedRequest:
+        '''prepare mode $22 request for repeated get_pid() calls'''
         assert pid in range(0xFFFF)
 
         request = VpwMessage(
@@ -100,16 +113,35 @@ class GmVehicle(Vehicle):
             DataRate.single_response
         )
 
-        response = self._device.send_message(request)[0]
-        return response.data
+        return self._device.prepare(request, responses=1)
 
-    def define_dpid(self, dpid: int, pid: int, size: int, offset: int):
-        '''mode $2C - define diagnostic data packet'''
+    def get_pid(self, pid: int | PreparedRequest) -> bytes:
+        '''mode $22 - request PID'''
+        if not isinstance(pid, PreparedRequest):
+            pid = self.prepare_get_pid(pid)
+
+        response = self._device.send_prepared(pid)[0]
+        return response[pid.data_start:-1]
+
+    def define_dpid(self, dpid: int, pid: int, size: int, offset: int, define_by: DefineBy = DefineBy.pid):
+        '''
+        mode $2C - define diagnostic data packet
+        pid is a PID or a memory address depending on define_by
+        '''
         assert dpid in range(0xFF)
-        assert pid in range(0xFFFF)
         assert offset >= 1
 
-        byte3 = 1 << 6 | offset << 3 | size # See SAE J2190 5.19
+        match define_by:
+            case DefineBy.pid:
+                assert pid in range(0xFFFF)
+                identifier = (*pid.to_bytes(2), 0xFF, 0xFF)
+            case DefineBy.address:
+                assert pid in range(0x1000000)
+                identifier = (*pid.to_bytes(3), 0xFF)
+            case _:
+                raise ValueError(f'unsupported definition type: {define_by}')
+
+        byte3 = define_by << 6 | offset << 3 | size # See SAE J2190 5.19
 
         request = VpwMessage(
             Priority.physical0,
@@ -117,7 +149,7 @@ class GmVehicle(Vehicle):
             PhysicalAddress.scantool,
             Mode.define_dpid,
             dpid,
-            (byte3, *pid.to_bytes(2), 0xFF, 0xFF)
+            (byte3, *identifier)
         )
 
         response = self._device.send_message(request)[0]
@@ -125,33 +157,36 @@ class GmVehicle(Vehicle):
         if response.mode == Mode.general_response:
             raise VehicleException('request refused')
 
-    def get_dpids(self, dpids: list[int, ...]) -> list[bytes]:
-        '''mode $2A - request diagnostic data packet'''
+    def prepare_get_dpids(self, dpids: list[int, ...]) -> PreparedRequest:
+        '''prepare mode $2A request for repeated get_dpids() calls'''
         assert 1 <= len(dpids) <= 6
         assert all(d in range(0xFF) for d in dpids)
 
         size = len(dpids)
         assert size == len(set(dpids))
 
-        dpids.extend([dpids[0] for _ in range(6 - size)]) # need 6 dpids
-
         request = VpwMessage(
             Priority.physical0,
             PhysicalAddress.pcm,
             PhysicalAddress.scantool,
             Mode.get_dpid,
             DataRate.single_response,
-            dpids
+            [*dpids, *(dpids[0] for _ in range(6 - size))] # need 6 dpids
         )
-        # must receive all 6 responses before sending anything else
-        responses = self._device.send_message(request, 6)
+        # must receive all 6 responses before sending anything else, duplicates are ignored
+        return self._device.prepare(request, 6, size)
+
+    def get_dpids(self, dpids: list[int, ...] | PreparedRequest) -> list[bytes]:
+        '''mode $2A - request diagnostic data packet'''
+        if not isinstance(dpids, PreparedRequest):
+            dpids = self.prepare_get_dpids(dpids)
 
         data = []
-        for response in responses[:size]: # ignore duplicates
-            if response.mode == Mode.general_response:
+        for response in self._device.send_prepared(dpids):
+            if response[3] == Mode.general_response:
                 raise VehicleException('request refused')
 
-            data.append(response.data)
+            data.append(response[dpids.data_start:-1])
 
         return data
 
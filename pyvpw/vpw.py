@@ -27,6 +27,14 @@ class DataRate(IntEnum):
     repeat_fast = 0x04
     stop_transmission = 0x00
 
+class DefineBy(IntEnum):
+    '''
+    bits 7,6 of the DPID definition byte (mode $2C byte 3)
+    See SAE J2190 section 5.19
+    '''
+    pid = 0x01 # 2 byte PID
+    address = 0x02 # 3 byte memory address
+
 class PhysicalAddress(IntEnum):
     scantool = 0xF0
     pcm = 0x10
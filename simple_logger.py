@@ -31,11 +31,13 @@ with open(LOGFILE, 'w') as f:
     fieldnames = ['time'] + PIDS
     writer = csv.DictWriter(f, fieldnames=fieldnames)
     writer.writeheader()
-    t_start = time.time()
+    t_start = time.monotonic()
     print('logging started. press ctrl+c to stop')
-    while True:
-        t = time.time()
-        row = {'time': (t - t_start)}
-        row.update(dl.get_row())
-        writer.writerow(row)
-        # print(f'{1 / (time.time() - t):.2f} Rows/Second')
\ No newline at end of file
+    try:
+        for sample in dl.stream():
+            row = {'time': (sample.time - t_start)}
+            row.update(sample.values)
+            writer.writerow(row)
+    except KeyboardInterrupt:
+        stats = dl.stats
+        print(f'{stats.samples} rows, {stats.rate:.2f} rows/second, jitter {stats.jitter * 1000:.1f} ms')